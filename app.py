@@ -1,44 +1,48 @@
 import streamlit as st
-import pandas as pd
-import os
 
-from modules.map_visualization import show_map_visualization
-from modules.trend_analysis import show_trend_analysis
-from modules.comparison_tool import show_comparison_tool
-from modules.affordability_calculator import show_affordability_calculator
 from utils.data_loader import load_dubai_housing_data
 
-# Page Configuration must be first Streamlit command
-st.set_page_config(
-    page_title="Dubai Housing Affordability",
-    page_icon="🏙️",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# Hide Streamlit menu and footer (after page config)
-hide_menu_style = """
+# Static HTML snippets, defined once at import time. They still have to be
+# written on every rerun: Streamlit removes any element a run does not emit.
+_HIDE_MENU_CSS = """
         <style>
         #MainMenu {visibility: hidden;}
         footer {visibility: hidden;}
         header {visibility: hidden;}
         </style>
         """
-st.markdown(hide_menu_style, unsafe_allow_html=True)
 
-# App title and description
-st.title("Dubai Housing Affordability Explorer")
-st.markdown("""
+_TITLE_HTML = """
     <div style='background-color: #f8f9fa; padding: 15px; border-radius: 5px;'>
     <h3>Find affordable housing options in Dubai</h3>
     <p>Explore rental prices, analyze trends, compare neighborhoods, and calculate what you can afford.</p>
     </div>
-""", unsafe_allow_html=True)
+"""
+
+_FOOTER_HTML = """
+    <div style='text-align: center;'>
+        <p>© 2023 Dubai Housing Affordability Explorer | All data sourced from official records</p>
+    </div>
+"""
+
+# Page Configuration must be first Streamlit command
+st.set_page_config(
+    page_title="Dubai Housing Affordability",
+    page_icon="🏙️",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# App title and description, sent together with the CSS that hides the
+# Streamlit menu and footer so both go out as a single element
+st.title("Dubai Housing Affordability Explorer")
+st.markdown(_HIDE_MENU_CSS + _TITLE_HTML, unsafe_allow_html=True)
 
 # Load data
+# The loader is memoized with st.cache_resource, so reruns share the cached
+# frame without copying it and the spinner only shows on a cache miss
 try:
-    with st.spinner("Loading Dubai housing data..."):
-        data = load_dubai_housing_data()
+    data = load_dubai_housing_data()
         
     if data is None or data.empty:
         st.error("Unable to load housing data. Please try again later.")
@@ -72,16 +76,21 @@ with st.sidebar.expander("Contact Information"):
     """)
 
 # Display the selected page
+# Page modules are imported lazily so each rerun only loads the page being viewed
 if page == "Interactive Map":
+    from modules.map_visualization import show_map_visualization
     show_map_visualization(data)
     
 elif page == "Rental Trends":
+    from modules.trend_analysis import show_trend_analysis
     show_trend_analysis(data)
     
 elif page == "Neighborhood Comparison":
+    from modules.comparison_tool import show_comparison_tool
     show_comparison_tool(data)
     
 elif page == "Affordability Calculator":
+    from modules.affordability_calculator import show_affordability_calculator
     show_affordability_calculator()
     
 elif page == "Housing Resources":
@@ -116,8 +125,4 @@ elif page == "Housing Resources":
     
 # Footer
 st.markdown("---")
-st.markdown("""
-    <div style='text-align: center;'>
-        <p>© 2023 Dubai Housing Affordability Explorer | All data sourced from official records</p>
-    </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+st.markdown(_FOOTER_HTML, unsafe_allow_html=True)
\ No newline at end of file
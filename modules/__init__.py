@@ -1,8 +1,5 @@
 # modules/__init__.py
 
 # This file makes the 'modules' directory a Python package
-# Import all module functions for easier access
-from .map_visualization import show_map_visualization
-from .trend_analysis import show_trend_analysis
-from .comparison_tool import show_comparison_tool
-from .affordability_calculator import show_affordability_calculator
\ No newline at end of file
+# Page modules are imported lazily from app.py so that only the selected
+# page pulls in its plotting dependencies
@@ -1,9 +1,137 @@
+import math
 import streamlit as st
 import numpy as np
-import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 
+# Static options for the housing preference inputs
+_AREAS = (
+    "Downtown Dubai", "Dubai Marina", "Jumeirah Beach Residence", "Business Bay",
+    "Arabian Ranches", "Dubai Silicon Oasis", "Jumeirah Village Circle",
+    "Motor City", "Dubai Sports City", "International City"
+)
+_PROPERTY_TYPES = ("Apartment", "Villa", "Townhouse", "Any")
+_BEDROOMS = ("Studio", "1", "2", "3", "4+", "Any")
+
+# Chart colours (plotly's default and "Safe" qualitative palettes)
+_BAR_COLORS = ("#636EFA", "#EF553B", "#00CC96", "#AB63FA", "#FFA15A")
+_PIE_COLORS = ("#88CCEE", "#CC6677", "#DDCC77", "#117733")
+
+# Number of years covered by the rent vs. buy projection
+_PROJECTION_YEARS = 10
+
+# Static layout for the rent vs. buy comparison chart
+_COMPARISON_LAYOUT = dict(
+    title="Cumulative Cost Comparison: Renting vs. Buying",
+    xaxis_title="Years",
+    yaxis_title="Cost (AED)",
+    legend=dict(
+        orientation="h",
+        yanchor="bottom",
+        y=1.02,
+        xanchor="right",
+        x=1
+    )
+)
+
+@st.cache_data(max_entries=128)
+def _compute_affordability(yearly_income, additional_income, down_payment, debt_payments,
+                           other_expenses, rent_income_ratio, mortgage_interest, mortgage_term):
+    """
+    Compute the affordability figures for a set of calculator inputs
+    
+    The inputs are plain scalars taken from the form widgets, so Streamlit can
+    hash them cheaply and reuse the result when the same inputs are seen again.
+    
+    Returns:
+        dict: Affordability figures, budget breakdown tables and rent-vs-buy series
+    """
+    # Calculate monthly income
+    monthly_income = yearly_income / 12 + additional_income
+    
+    # Calculate affordable monthly rent based on income ratio
+    affordable_rent = monthly_income * (rent_income_ratio / 100)
+    
+    # Calculate affordable yearly rent
+    affordable_yearly_rent = affordable_rent * 12
+    
+    # Calculate affordable purchase price based on mortgage parameters
+    monthly_payment_capacity = affordable_rent - debt_payments
+    
+    # Calculate the maximum mortgage amount
+    r = mortgage_interest / 100 / 12  # Monthly interest rate
+    n = mortgage_term * 12  # Total number of payments
+    
+    # Maximum mortgage amount calculation using the present value formula,
+    # with (1 + r) ** n - 1 evaluated via expm1/log1p for accuracy at small r
+    if r > 0:
+        growth = math.expm1(n * math.log1p(r))
+        max_mortgage = monthly_payment_capacity * (growth / (r * (growth + 1)))
+    else:
+        max_mortgage = monthly_payment_capacity * n
+    
+    # Maximum purchase price including down payment
+    max_purchase_price = max_mortgage + down_payment
+    
+    # Monthly income breakdown for the detailed calculation
+    income_data = {
+        "Category": ["Monthly Income", "Recommended Housing Budget", "Monthly Debt Payments", "Other Expenses", "Remaining Budget"],
+        "Amount (AED)": [
+            monthly_income,
+            affordable_rent,
+            debt_payments,
+            other_expenses,
+            monthly_income - affordable_rent - debt_payments - other_expenses
+        ]
+    }
+    
+    # Recommended allocation of monthly expenses
+    expense_data = {
+        "Category": ["Housing", "Debt Payments", "Other Expenses", "Savings/Discretionary"],
+        "Amount (AED)": [
+            affordable_rent,
+            debt_payments,
+            other_expenses,
+            max(0, monthly_income - affordable_rent - debt_payments - other_expenses)
+        ]
+    }
+    
+    # Calculate projected costs over time
+    years = np.arange(1, _PROJECTION_YEARS + 1)
+    
+    # Assume rent increases by 5% per year
+    rent_growth = np.full(_PROJECTION_YEARS, 1.05)
+    rent_growth[0] = 1.0
+    rent_costs = affordable_yearly_rent * np.cumprod(rent_growth)
+    cumulative_rent = np.cumsum(rent_costs)
+    
+    # The maximum mortgage is the present value of the monthly payment capacity,
+    # so the amortized payment on that loan is exactly the capacity itself.
+    # Payments are constant, so the running total is a closed-form product,
+    # plus the down payment made in the first year
+    yearly_mortgage = monthly_payment_capacity * 12
+    cumulative_mortgage = yearly_mortgage * years + down_payment
+    
+    # Assume property value appreciates by 3% per year
+    appreciation = np.full(_PROJECTION_YEARS, 1.03)
+    appreciation[0] = 1.0
+    property_values = max_purchase_price * np.cumprod(appreciation)
+    
+    # Calculate net cost of buying (mortgage payments - property value appreciation)
+    net_buying_cost = cumulative_mortgage - property_values + max_purchase_price
+    
+    return {
+        "affordable_rent": affordable_rent,
+        "affordable_yearly_rent": affordable_yearly_rent,
+        "monthly_payment_capacity": monthly_payment_capacity,
+        "max_mortgage": max_mortgage,
+        "max_purchase_price": max_purchase_price,
+        "income_data": income_data,
+        "expense_data": expense_data,
+        "years": years,
+        "cumulative_rent": cumulative_rent,
+        "net_buying_cost": net_buying_cost
+    }
+
 def show_affordability_calculator():
     """
     Display an affordability calculator to help users determine what they can afford
@@ -11,8 +139,11 @@ def show_affordability_calculator():
     st.header("Housing Affordability Calculator")
     st.write("Calculate how much housing you can afford based on your income and expenses.")
     
+    # Results stay visible once the form has been submitted in this session
+    st.session_state.setdefault("show_results", False)
+    
     # Create a form for user inputs
-    with st.form("affordability_form"):
+    with st.form("affordability_form", clear_on_submit=False):
         col1, col2 = st.columns(2)
         
         with col1:
@@ -22,7 +153,8 @@ def show_affordability_calculator():
                 min_value=0,
                 value=200000,
                 step=10000,
-                help="Your total annual income before taxes"
+                help="Your total annual income before taxes",
+                key="yearly_income"
             )
             
             additional_income = st.number_input(
@@ -30,7 +162,8 @@ def show_affordability_calculator():
                 min_value=0,
                 value=0,
                 step=500,
-                help="Any additional monthly income such as bonuses, rental income, etc."
+                help="Any additional monthly income such as bonuses, rental income, etc.",
+                key="additional_income"
             )
             
             st.subheader("Savings")
@@ -39,7 +172,8 @@ def show_affordability_calculator():
                 min_value=0,
                 value=50000,
                 step=10000,
-                help="Amount you have available for a down payment if purchasing"
+                help="Amount you have available for a down payment if purchasing",
+                key="down_payment"
             )
         
         with col2:
@@ -49,7 +183,8 @@ def show_affordability_calculator():
                 min_value=0,
                 value=2000,
                 step=500,
-                help="Car loans, credit cards, personal loans, etc."
+                help="Car loans, credit cards, personal loans, etc.",
+                key="debt_payments"
             )
             
             other_expenses = st.number_input(
@@ -57,26 +192,28 @@ def show_affordability_calculator():
                 min_value=0,
                 value=5000,
                 step=500,
-                help="Food, transportation, entertainment, etc."
+                help="Food, transportation, entertainment, etc.",
+                key="other_expenses"
             )
             
             st.subheader("Housing Preferences")
             preferred_areas = st.multiselect(
                 "Preferred Areas",
-                ["Downtown Dubai", "Dubai Marina", "Jumeirah Beach Residence", "Business Bay", 
-                 "Arabian Ranches", "Dubai Silicon Oasis", "Jumeirah Village Circle", 
-                 "Motor City", "Dubai Sports City", "International City"],
-                default=["Dubai Marina", "Business Bay"]
+                _AREAS,
+                default=["Dubai Marina", "Business Bay"],
+                key="preferred_areas"
             )
             
             preferred_property_type = st.selectbox(
                 "Preferred Property Type",
-                ["Apartment", "Villa", "Townhouse", "Any"]
+                _PROPERTY_TYPES,
+                key="preferred_property_type"
             )
             
             preferred_bedrooms = st.selectbox(
                 "Preferred Bedrooms",
-                ["Studio", "1", "2", "3", "4+", "Any"]
+                _BEDROOMS,
+                key="preferred_bedrooms"
             )
         
         # Calculator settings
@@ -86,7 +223,8 @@ def show_affordability_calculator():
                 min_value=20,
                 max_value=40,
                 value=30,
-                help="Percentage of income that should go toward housing (30% is standard)"
+                help="Percentage of income that should go toward housing (30% is standard)",
+                key="rent_income_ratio"
             )
             
             mortgage_interest = st.slider(
@@ -95,7 +233,8 @@ def show_affordability_calculator():
                 max_value=10.0,
                 value=4.0,
                 step=0.1,
-                help="Current mortgage interest rate"
+                help="Current mortgage interest rate",
+                key="mortgage_interest"
             )
             
             mortgage_term = st.slider(
@@ -104,80 +243,58 @@ def show_affordability_calculator():
                 max_value=30,
                 value=25,
                 step=1,
-                help="Length of mortgage loan"
+                help="Length of mortgage loan",
+                key="mortgage_term"
             )
         
         submitted = st.form_submit_button("Calculate Affordability")
     
-    if submitted or "show_results" in st.session_state:
+    if submitted or st.session_state.show_results:
         # Set a session state variable to show results even after the form is reset
         st.session_state.show_results = True
         
-        # Calculate monthly income
-        monthly_income = yearly_income / 12 + additional_income
-        
-        # Calculate affordable monthly rent based on income ratio
-        affordable_rent = monthly_income * (rent_income_ratio / 100)
-        
-        # Calculate affordable yearly rent
-        affordable_yearly_rent = affordable_rent * 12
-        
-        # Calculate affordable purchase price based on mortgage parameters
-        monthly_payment_capacity = affordable_rent - debt_payments
-        
-        # Calculate the maximum mortgage amount
-        r = mortgage_interest / 100 / 12  # Monthly interest rate
-        n = mortgage_term * 12  # Total number of payments
-        
-        # Maximum mortgage amount calculation using the present value formula
-        if r > 0:
-            max_mortgage = monthly_payment_capacity * ((1 - (1 + r) ** -n) / r)
-        else:
-            max_mortgage = monthly_payment_capacity * n
-        
-        # Maximum purchase price including down payment
-        max_purchase_price = max_mortgage + down_payment
+        results = _compute_affordability(
+            yearly_income, additional_income, down_payment, debt_payments,
+            other_expenses, rent_income_ratio, mortgage_interest, mortgage_term
+        )
+        affordable_rent = results["affordable_rent"]
+        affordable_yearly_rent = results["affordable_yearly_rent"]
+        monthly_payment_capacity = results["monthly_payment_capacity"]
+        max_mortgage = results["max_mortgage"]
+        max_purchase_price = results["max_purchase_price"]
         
         # Display results
         st.subheader("Affordability Results")
         
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.metric("Affordable Monthly Rent", f"{affordable_rent:,.0f} AED")
-            st.metric("Affordable Yearly Rent", f"{affordable_yearly_rent:,.0f} AED")
+        result_metrics = (
+            ("Affordable Monthly Rent", f"{affordable_rent:,.0f} AED"),
+            ("Affordable Yearly Rent", f"{affordable_yearly_rent:,.0f} AED"),
+            ("Maximum Purchase Price", f"{max_purchase_price:,.0f} AED"),
+            ("Maximum Mortgage Amount", f"{max_mortgage:,.0f} AED")
+        )
         
-        with col2:
-            st.metric("Maximum Purchase Price", f"{max_purchase_price:,.0f} AED")
-            st.metric("Maximum Mortgage Amount", f"{max_mortgage:,.0f} AED")
+        for col, (label, value) in zip(st.columns(len(result_metrics)), result_metrics):
+            col.metric(label, value)
         
         # Show a detailed breakdown of the affordability calculation
         with st.expander("View Detailed Calculation"):
             st.write("### Monthly Income Breakdown")
-            income_data = {
-                "Category": ["Monthly Income", "Recommended Housing Budget", "Monthly Debt Payments", "Other Expenses", "Remaining Budget"],
-                "Amount (AED)": [
-                    monthly_income,
-                    affordable_rent,
-                    debt_payments,
-                    other_expenses,
-                    monthly_income - affordable_rent - debt_payments - other_expenses
-                ]
-            }
-            
-            income_df = pd.DataFrame(income_data)
+            income_data = results["income_data"]
             
             # Create a bar chart for the income breakdown
-            fig = px.bar(
-                income_df,
-                x="Category",
-                y="Amount (AED)",
+            fig = go.Figure(go.Bar(
+                x=income_data["Category"],
+                y=income_data["Amount (AED)"],
+                text=[f"{amount:.0f}" for amount in income_data["Amount (AED)"]],
+                marker_color=_BAR_COLORS[:len(income_data["Category"])]
+            ))
+            
+            fig.update_layout(
                 title="Monthly Budget Breakdown",
-                color="Category",
-                text_auto='.0f'
+                xaxis_title="Category",
+                yaxis_title="Amount (AED)",
+                showlegend=False
             )
-            
-            fig.update_layout(showlegend=False)
             st.plotly_chart(fig, use_container_width=True)
             
             # Mortgage calculation details
@@ -188,85 +305,46 @@ def show_affordability_calculator():
             st.write(f"Loan Term: {mortgage_term} years")
             st.write(f"Estimated Monthly Mortgage Payment: {monthly_payment_capacity:,.0f} AED")
         
-        # Show a pie chart of expenses
-        expense_data = {
-            "Category": ["Housing", "Debt Payments", "Other Expenses", "Savings/Discretionary"],
-            "Amount (AED)": [
-                affordable_rent,
-                debt_payments,
-                other_expenses,
-                max(0, monthly_income - affordable_rent - debt_payments - other_expenses)
-            ]
-        }
-        
-        expense_df = pd.DataFrame(expense_data)
-        
-        fig = px.pie(
-            expense_df,
-            values="Amount (AED)",
-            names="Category",
-            title="Recommended Monthly Expense Allocation",
-            color="Category",
-            color_discrete_sequence=px.colors.qualitative.Safe
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        # Show a pie chart of expenses, collapsed by default like the detailed breakdown
+        with st.expander("View Recommended Expense Allocation"):
+            expense_data = results["expense_data"]
+            
+            fig = go.Figure(go.Pie(
+                labels=expense_data["Category"],
+                values=expense_data["Amount (AED)"],
+                marker_colors=_PIE_COLORS[:len(expense_data["Category"])]
+            ))
+            
+            fig.update_layout(title="Recommended Monthly Expense Allocation")
+            
+            st.plotly_chart(fig, use_container_width=True)
         
         # Mortgage vs. Rent comparison
         st.subheader("Rent vs. Buy Comparison")
         
-        # Calculate projected costs over time
-        years = list(range(1, 11))
-        
-        # Assume rent increases by 5% per year
-        rent_costs = [affordable_yearly_rent * ((1 + 0.05) ** i) for i in range(len(years))]
-        cumulative_rent = np.cumsum(rent_costs)
-        
-        # Calculate mortgage principal and interest payments
-        monthly_mortgage = max_mortgage * (r * (1 + r) ** n) / ((1 + r) ** n - 1) if r > 0 else max_mortgage / n
-        yearly_mortgage = monthly_mortgage * 12
-        mortgage_costs = [yearly_mortgage] * len(years)
-        cumulative_mortgage = np.cumsum(mortgage_costs)
-        
-        # Add in down payment to first year of mortgage
-        cumulative_mortgage = cumulative_mortgage + down_payment
-        
-        # Assume property value appreciates by 3% per year
-        property_values = [max_purchase_price * ((1 + 0.03) ** i) for i in range(len(years))]
-        
-        # Calculate net cost of buying (mortgage payments - property value appreciation)
-        net_buying_cost = cumulative_mortgage - np.array(property_values) + max_purchase_price
+        years = results["years"]
+        cumulative_rent = results["cumulative_rent"]
+        net_buying_cost = results["net_buying_cost"]
         
         # Create comparison chart
-        fig = go.Figure()
-        
-        fig.add_trace(go.Scatter(
-            x=years,
-            y=cumulative_rent,
-            mode="lines+markers",
-            name="Cumulative Rent Cost",
-            line=dict(color="red", width=2)
-        ))
-        
-        fig.add_trace(go.Scatter(
-            x=years,
-            y=net_buying_cost,
-            mode="lines+markers",
-            name="Net Cost of Buying",
-            line=dict(color="green", width=2)
-        ))
-        
-        fig.update_layout(
-            title="Cumulative Cost Comparison: Renting vs. Buying",
-            xaxis_title="Years",
-            yaxis_title="Cost (AED)",
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            )
+        fig = go.Figure(
+            data=[
+                go.Scatter(
+                    x=years,
+                    y=cumulative_rent,
+                    mode="lines+markers",
+                    name="Cumulative Rent Cost",
+                    line=dict(color="red", width=2)
+                ),
+                go.Scatter(
+                    x=years,
+                    y=net_buying_cost,
+                    mode="lines+markers",
+                    name="Net Cost of Buying",
+                    line=dict(color="green", width=2)
+                )
+            ],
+            layout=_COMPARISON_LAYOUT
         )
         
         st.plotly_chart(fig, use_container_width=True)
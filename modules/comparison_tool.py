@@ -1,9 +1,156 @@
+import zlib
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from utils.constants import NEIGHBORHOOD_INFO
+from utils.data_loader import get_filter_options, listing_mask
+
+# Columns this page reads; everything else is dropped on entry
+_USED_COLUMNS = [
+    "neighborhood", "property_type", "bedrooms", "price_yearly_aed", "price_per_sqft"
+]
+
+def _neighborhood_listings(data, selected_neighborhoods, property_type, bedrooms):
+    """
+    Listings in the selected neighborhoods matching the property type and bedroom option
+    
+    Parameters:
+    - data: DataFrame containing Dubai housing data
+    - selected_neighborhoods: Neighborhood names to compare
+    - property_type: Selected property type, or "All"
+    - bedrooms: Selected bedroom option, or "All"
+    """
+    mask = listing_mask(data, property_type, bedrooms)
+    mask &= data["neighborhood"].isin(selected_neighborhoods).values
+    return data[mask]
+
+@st.cache_data(ttl=3600)
+def _price_summary(_data, selected_neighborhoods, property_type, bedrooms):
+    """
+    Aggregate price statistics per neighborhood for the price comparison tab
+    
+    The frame is passed as _data, which Streamlit doesn't hash, so entries
+    are keyed on the selections only and callers must pass the same frame
+    on every rerun.
+    
+    Parameters:
+    - _data: DataFrame containing Dubai housing data
+    - selected_neighborhoods: Tuple of neighborhood names to compare
+    - property_type: Selected property type, or "All"
+    - bedrooms: Selected bedroom option, or "All"
+    """
+    neighborhood_data = _neighborhood_listings(_data, selected_neighborhoods, property_type, bedrooms)
+    price_comparison = (
+        neighborhood_data.groupby("neighborhood", observed=True, sort=False)
+        .agg({
+            "price_yearly_aed": ["mean", "median", "min", "max", "count"],
+            "price_per_sqft": ["mean", "median"] if "price_per_sqft" in neighborhood_data.columns else ["mean"]
+        })
+    )
+    
+    # Flatten the column names
+    price_comparison.columns = [f"{x}_{y}" for x, y in price_comparison.columns]
+    
+    # Prices are only ever shown as whole dirhams, and integers make a much
+    # smaller chart payload than full-precision floats
+    yearly_price_columns = ["price_yearly_aed_mean", "price_yearly_aed_median", "price_yearly_aed_min", "price_yearly_aed_max"]
+    price_comparison[yearly_price_columns] = price_comparison[yearly_price_columns].round().astype(np.int32)
+    return price_comparison.reset_index()
+
+def _budget_stats(codes, prices, affordable_yearly_rent, n_groups):
+    """
+    Per-group listing count, average price and percentage within budget
+    
+    Each statistic is a single np.bincount pass over the group codes, so no
+    per-group DataFrame is materialized.
+    
+    Parameters:
+    - codes: Integer group code for each listing
+    - prices: Yearly price for each listing
+    - affordable_yearly_rent: Yearly rent budget in AED
+    - n_groups: Total number of groups
+    
+    Returns:
+        tuple: (counts, average prices, percentage within budget) indexed by group code
+    """
+    counts = np.bincount(codes, minlength=n_groups)
+    price_totals = np.bincount(codes, weights=prices, minlength=n_groups)
+    within_counts = np.bincount(codes, weights=prices <= affordable_yearly_rent, minlength=n_groups)
+    
+    # Empty groups divide by 1 so they read as zero instead of NaN
+    safe_counts = np.where(counts, counts, 1)
+    return counts, price_totals / safe_counts, within_counts / safe_counts * 100
+
+def _affordability_summary(neighborhood_data, selected_neighborhoods, affordable_yearly_rent):
+    """
+    Calculate affordability metrics for each selected neighborhood
+    
+    Parameters:
+    - neighborhood_data: DataFrame of listings in the selected neighborhoods
+    - selected_neighborhoods: Tuple of neighborhood names in display order
+    - affordable_yearly_rent: Yearly rent budget in AED
+    """
+    categories = neighborhood_data["neighborhood"].cat.categories
+    counts, avg_prices, within_budget_pcts = _budget_stats(
+        neighborhood_data["neighborhood"].cat.codes.values,
+        neighborhood_data["price_yearly_aed"].values,
+        affordable_yearly_rent,
+        len(categories)
+    )
+    
+    affordability_data = []
+    
+    # Look up the category code of every selected neighborhood at once
+    selected_codes = categories.get_indexer(selected_neighborhoods)
+    
+    for neighborhood, code in zip(selected_neighborhoods, selected_codes):
+        if code >= 0 and counts[code] > 0:
+            avg_price = avg_prices[code]
+            affordability_ratio = avg_price / affordable_yearly_rent
+            affordability_status = "Affordable" if affordability_ratio <= 1 else "Unaffordable"
+            affordability_score = max(0, min(100, int((1 - (affordability_ratio - 1)) * 100))) if affordability_ratio > 1 else 100
+            
+            # Percentage of properties within budget
+            within_budget = within_budget_pcts[code]
+            
+            affordability_data.append({
+                "neighborhood": neighborhood,
+                "avg_price": avg_price,
+                "affordability_ratio": affordability_ratio,
+                "affordability_status": affordability_status,
+                "affordability_score": affordability_score,
+                "within_budget_pct": within_budget
+            })
+    
+    return pd.DataFrame(affordability_data)
+
+@st.cache_data
+def _placeholder_info(neighborhood):
+    """
+    Build stable placeholder lifestyle data for a neighborhood missing from NEIGHBORHOOD_INFO
+    
+    The generator is seeded from the neighborhood name, so the values stay the
+    same across reruns and processes.
+    
+    Parameters:
+    - neighborhood: Name of the neighborhood
+    """
+    rng = np.random.default_rng(zlib.crc32(neighborhood.encode("utf-8")))
+    
+    return {
+        "neighborhood": neighborhood,
+        "commute_time": int(rng.integers(10, 45)),
+        "schools_rating": int(rng.integers(1, 5)),
+        "shopping_rating": int(rng.integers(1, 5)),
+        "dining_rating": int(rng.integers(1, 5)),
+        "parks_rating": int(rng.integers(1, 5)),
+        "metro_access": bool(rng.choice([True, False])),
+        "beach_access": bool(rng.choice([True, False])),
+        "lifestyle": str(rng.choice(["Family", "Singles", "Mixed"])),
+        "parking_availability": str(rng.choice(["Limited", "Adequate", "Abundant"]))
+    }
 
 def show_comparison_tool(data):
     """
@@ -12,11 +159,23 @@ def show_comparison_tool(data):
     Parameters:
     - data: DataFrame containing Dubai housing data
     """
+    # Keep only the columns this page uses, so filtering copies less data
+    data = data[[col for col in _USED_COLUMNS if col in data.columns]]
+    
+    # The loader stores these columns as categoricals; convert here only if a
+    # caller passes plain string columns, since the helpers below read .cat
+    if not isinstance(data["neighborhood"].dtype, pd.CategoricalDtype):
+        data = data.assign(
+            neighborhood=data["neighborhood"].astype("category"),
+            property_type=data["property_type"].astype("category")
+        )
+    
     st.header("Neighborhood Comparison Tool")
     st.write("Compare rental prices, amenities, and lifestyle factors across different Dubai neighborhoods.")
     
-    # Get unique neighborhoods from data
-    neighborhoods = sorted(data["neighborhood"].unique().tolist())
+    # Get unique neighborhoods and property types from data
+    filter_options = get_filter_options(data)
+    neighborhoods = filter_options["neighborhoods"]
     
     # Allow user to select neighborhoods to compare (up to 4)
     st.subheader("Select Neighborhoods to Compare")
@@ -38,31 +197,14 @@ def show_comparison_tool(data):
         selected_neighborhoods.append(neighborhood4)
     
     # Property type filter
-    property_types = ["All"] + sorted(data["property_type"].unique().tolist())
-    selected_property_type = st.selectbox("Property Type", property_types, key="comp_prop_type")
+    selected_property_type = st.selectbox("Property Type", filter_options["property_types"], key="comp_prop_type")
     
     # Bedrooms filter
     bedroom_options = ["All", "Studio", "1 BR", "2 BR", "3+ BR"]
     selected_bedrooms = st.selectbox("Bedrooms", bedroom_options, key="comp_bedrooms")
     
-    # Filter data for comparison
-    filtered_data = data.copy()
-    
-    if selected_property_type != "All":
-        filtered_data = filtered_data[filtered_data["property_type"] == selected_property_type]
-    
-    if selected_bedrooms != "All":
-        if selected_bedrooms == "Studio":
-            filtered_data = filtered_data[filtered_data["bedrooms"] == 0]
-        elif selected_bedrooms == "1 BR":
-            filtered_data = filtered_data[filtered_data["bedrooms"] == 1]
-        elif selected_bedrooms == "2 BR":
-            filtered_data = filtered_data[filtered_data["bedrooms"] == 2]
-        elif selected_bedrooms == "3+ BR":
-            filtered_data = filtered_data[filtered_data["bedrooms"] >= 3]
-    
-    # Filter for selected neighborhoods
-    neighborhood_data = filtered_data[filtered_data["neighborhood"].isin(selected_neighborhoods)]
+    # Filter data for the selected neighborhoods
+    neighborhood_data = _neighborhood_listings(data, selected_neighborhoods, selected_property_type, selected_bedrooms)
     
     # If there's no data for some neighborhoods, inform the user
     missing_neighborhoods = [n for n in selected_neighborhoods if n not in neighborhood_data["neighborhood"].unique()]
@@ -77,17 +219,7 @@ def show_comparison_tool(data):
         
         if len(neighborhood_data) > 0:
             # Calculate average and median prices per neighborhood
-            price_comparison = (
-                neighborhood_data.groupby("neighborhood")
-                .agg({
-                    "price_yearly_aed": ["mean", "median", "min", "max", "count"],
-                    "price_per_sqft": ["mean", "median"] if "price_per_sqft" in neighborhood_data.columns else ["mean"]
-                })
-            )
-            
-            # Flatten the column names
-            price_comparison.columns = [f"{x}_{y}" for x, y in price_comparison.columns]
-            price_comparison = price_comparison.reset_index()
+            price_comparison = _price_summary(data, tuple(selected_neighborhoods), selected_property_type, selected_bedrooms)
             
             # Bar chart comparing average prices
             fig = px.bar(
@@ -104,21 +236,15 @@ def show_comparison_tool(data):
             st.plotly_chart(fig, use_container_width=True)
             
             # Display detailed price metrics in a table
-            price_comparison_display = price_comparison.copy()
-            price_comparison_display = price_comparison_display.rename(columns={
+            price_comparison_display = price_comparison.rename(columns={
                 "price_yearly_aed_mean": "Average (AED/year)",
                 "price_yearly_aed_median": "Median (AED/year)",
                 "price_yearly_aed_min": "Minimum (AED/year)",
                 "price_yearly_aed_max": "Maximum (AED/year)",
                 "price_yearly_aed_count": "Available Properties",
-                "price_per_sqft_mean": "Avg Price/sqft (AED)" if "price_per_sqft_mean" in price_comparison_display.columns else ""
+                "price_per_sqft_mean": "Avg Price/sqft (AED)" if "price_per_sqft_mean" in price_comparison.columns else ""
             })
             
-            # Format numbers
-            for col in price_comparison_display.columns:
-                if col != "neighborhood" and col != "Available Properties":
-                    price_comparison_display[col] = price_comparison_display[col].apply(lambda x: f"{int(x):,}")
-            
             # Select and order columns
             columns_to_display = ["neighborhood", "Average (AED/year)", "Median (AED/year)", 
                                  "Minimum (AED/year)", "Maximum (AED/year)"]
@@ -128,15 +254,25 @@ def show_comparison_tool(data):
                 
             columns_to_display.append("Available Properties")
             
-            st.dataframe(price_comparison_display[columns_to_display], hide_index=True)
+            # Format numbers with a Styler instead of converting each cell to a string
+            price_columns = [col for col in columns_to_display if col not in ("neighborhood", "Available Properties")]
+            styled_display = (
+                price_comparison_display[columns_to_display].style
+                .format({col: "{:,.0f}" for col in price_columns})
+                .format({"Available Properties": "{:,}"})
+            )
+            
+            st.dataframe(styled_display, hide_index=True)
             
             # Price distribution by property type
             if "property_type" in neighborhood_data.columns and len(neighborhood_data["property_type"].unique()) > 1:
                 st.subheader("Price by Property Type")
                 
                 property_type_comparison = (
-                    neighborhood_data.groupby(["neighborhood", "property_type"])
+                    neighborhood_data.groupby(["neighborhood", "property_type"], observed=True)
                     .agg({"price_yearly_aed": "mean"})
+                    .round()
+                    .astype(np.int32)
                     .reset_index()
                 )
                 
@@ -177,42 +313,21 @@ def show_comparison_tool(data):
         
         if len(neighborhood_data) > 0:
             # Calculate affordability index for each neighborhood
-            affordability_data = []
-            
-            for neighborhood in selected_neighborhoods:
-                nb_data = neighborhood_data[neighborhood_data["neighborhood"] == neighborhood]
-                
-                if len(nb_data) > 0:
-                    avg_price = nb_data["price_yearly_aed"].mean()
-                    affordability_ratio = avg_price / affordable_yearly_rent
-                    affordability_status = "Affordable" if affordability_ratio <= 1 else "Unaffordable"
-                    affordability_score = max(0, min(100, int((1 - (affordability_ratio - 1)) * 100))) if affordability_ratio > 1 else 100
-                    
-                    # Percentage of properties within budget
-                    within_budget = (nb_data["price_yearly_aed"] <= affordable_yearly_rent).mean() * 100
-                    
-                    affordability_data.append({
-                        "neighborhood": neighborhood,
-                        "avg_price": avg_price,
-                        "affordability_ratio": affordability_ratio,
-                        "affordability_status": affordability_status,
-                        "affordability_score": affordability_score,
-                        "within_budget_pct": within_budget
-                    })
-            
-            affordability_df = pd.DataFrame(affordability_data)
+            affordability_df = _affordability_summary(
+                neighborhood_data, tuple(selected_neighborhoods), affordable_yearly_rent
+            )
             
             if len(affordability_df) > 0:
                 # Create gauge charts for affordability score
                 cols = st.columns(len(affordability_df))
                 
-                for i, (_, row) in enumerate(affordability_df.iterrows()):
-                    with cols[i]:
+                for col, row in zip(cols, affordability_df.itertuples(index=False)):
+                    with col:
                         # Create gauge chart
                         fig = go.Figure(go.Indicator(
                             mode="gauge+number",
-                            value=row["affordability_score"],
-                            title={"text": row["neighborhood"]},
+                            value=row.affordability_score,
+                            title={"text": row.neighborhood},
                             gauge={
                                 "axis": {"range": [0, 100]},
                                 "bar": {"color": "#E6B800"},
@@ -224,7 +339,7 @@ def show_comparison_tool(data):
                                 "threshold": {
                                     "line": {"color": "black", "width": 4},
                                     "thickness": 0.75,
-                                    "value": row["affordability_score"]
+                                    "value": row.affordability_score
                                 }
                             }
                         ))
@@ -234,11 +349,11 @@ def show_comparison_tool(data):
                         
                         st.metric(
                             "Average Yearly Rent",
-                            f"{int(row['avg_price']):,} AED",
-                            f"{'-' if row['affordability_ratio'] > 1 else '+'}{abs(row['affordability_ratio'] - 1) * 100:.1f}% {'above' if row['affordability_ratio'] > 1 else 'below'} budget"
+                            f"{int(row.avg_price):,} AED",
+                            f"{'-' if row.affordability_ratio > 1 else '+'}{abs(row.affordability_ratio - 1) * 100:.1f}% {'above' if row.affordability_ratio > 1 else 'below'} budget"
                         )
                         
-                        st.write(f"Properties within budget: **{row['within_budget_pct']:.1f}%**")
+                        st.write(f"Properties within budget: **{row.within_budget_pct:.1f}%**")
                 
                 # Bar chart showing percentage of properties within budget
                 fig = px.bar(
@@ -265,25 +380,17 @@ def show_comparison_tool(data):
         # This would ideally come from real data about neighborhoods
         # For now, we'll use the constant data from constants.py
         
+        # Look each neighborhood up once; the descriptions below reuse these
+        neighborhood_infos = [NEIGHBORHOOD_INFO.get(neighborhood) for neighborhood in selected_neighborhoods]
+        
         lifestyle_data = []
         
-        for neighborhood in selected_neighborhoods:
-            if neighborhood in NEIGHBORHOOD_INFO:
-                lifestyle_data.append(NEIGHBORHOOD_INFO[neighborhood])
+        for neighborhood, info in zip(selected_neighborhoods, neighborhood_infos):
+            if info is not None:
+                lifestyle_data.append(info)
             else:
-                # Create placeholder data if not in constants
-                lifestyle_data.append({
-                    "neighborhood": neighborhood,
-                    "commute_time": np.random.randint(10, 45),
-                    "schools_rating": np.random.randint(1, 5),
-                    "shopping_rating": np.random.randint(1, 5),
-                    "dining_rating": np.random.randint(1, 5),
-                    "parks_rating": np.random.randint(1, 5),
-                    "metro_access": np.random.choice([True, False]),
-                    "beach_access": np.random.choice([True, False]),
-                    "lifestyle": np.random.choice(["Family", "Singles", "Mixed"]),
-                    "parking_availability": np.random.choice(["Limited", "Adequate", "Abundant"])
-                })
+                # Use placeholder data if not in constants
+                lifestyle_data.append(_placeholder_info(neighborhood))
         
         lifestyle_df = pd.DataFrame(lifestyle_data)
         
@@ -292,16 +399,16 @@ def show_comparison_tool(data):
         
         fig = go.Figure()
         
-        for _, row in lifestyle_df.iterrows():
+        for row in lifestyle_df.itertuples(index=False):
             # Normalize commute time (lower is better)
-            commute_normalized = 5 - min(5, row["commute_time"] / 10)
+            commute_normalized = 5 - min(5, row.commute_time / 10)
             
             fig.add_trace(go.Scatterpolar(
-                r=[commute_normalized, row["schools_rating"], row["shopping_rating"], 
-                   row["dining_rating"], row["parks_rating"]],
+                r=[commute_normalized, row.schools_rating, row.shopping_rating, 
+                   row.dining_rating, row.parks_rating],
                 theta=categories,
                 fill='toself',
-                name=row["neighborhood"]
+                name=row.neighborhood
             ))
         
         fig.update_layout(
@@ -331,8 +438,8 @@ def show_comparison_tool(data):
         })
         
         # Format boolean values
-        comparison_table["Metro Access"] = comparison_table["Metro Access"].apply(lambda x: "✅" if x else "❌")
-        comparison_table["Beach Access"] = comparison_table["Beach Access"].apply(lambda x: "✅" if x else "❌")
+        for access_column in ("Metro Access", "Beach Access"):
+            comparison_table[access_column] = np.where(comparison_table[access_column].to_numpy(dtype=bool), "✅", "❌")
         
         st.dataframe(comparison_table[[
             "neighborhood", "Avg. Commute Time (min)", "Schools (1-5)", 
@@ -343,8 +450,6 @@ def show_comparison_tool(data):
         # Neighborhood descriptions
         st.subheader("Neighborhood Descriptions")
         
-        for neighborhood in selected_neighborhoods:
-            if neighborhood in NEIGHBORHOOD_INFO and "description" in NEIGHBORHOOD_INFO[neighborhood]:
-                st.write(f"**{neighborhood}**: {NEIGHBORHOOD_INFO[neighborhood]['description']}")
-            else:
-                st.write(f"**{neighborhood}**: Detailed description not available.")
+        for neighborhood, info in zip(selected_neighborhoods, neighborhood_infos):
+            description = (info or {}).get("description")
+            st.write(f"**{neighborhood}**: {description or 'Detailed description not available.'}")
@@ -1,9 +1,158 @@
 import streamlit as st
 import folium
-from streamlit_folium import folium_static
 import pandas as pd
+import numpy as np
 import altair as alt
 from utils.constants import DUBAI_COORDINATES, NEIGHBORHOOD_INFO
+from utils.data_loader import get_filter_options, listing_mask
+
+# Two-character hex strings for every byte value, used to build marker colors
+_HEX_BYTES = np.array([f"{i:02x}" for i in range(256)])
+
+# Columns this page reads; everything else is dropped on entry
+_USED_COLUMNS = [
+    "neighborhood", "property_type", "bedrooms", "size_sqft",
+    "price_yearly_aed", "price_monthly_aed", "lat", "lng"
+]
+
+def _filter_listings(data, property_type, bedrooms, price_range):
+    """
+    Filter listings by the map's property type, bedroom and price selections
+    
+    Parameters:
+    - data: DataFrame containing Dubai housing data
+    - property_type: Selected property type, or "All"
+    - bedrooms: Selected bedroom option, or "All"
+    - price_range: (min, max) yearly rent in AED, inclusive
+    """
+    prices = data["price_yearly_aed"].values
+    mask = listing_mask(data, property_type, bedrooms)
+    mask &= (prices >= price_range[0]) & (prices <= price_range[1])
+    return data[mask]
+
+@st.cache_data(ttl=3600)
+def _neighborhood_summary(_data, property_type, bedrooms, price_range):
+    """
+    Aggregate average price, listing count and centroid per neighborhood
+    
+    The frame is passed as _data, which Streamlit doesn't hash, so entries
+    are keyed on the selections only and callers must pass the same frame
+    on every rerun.
+    
+    Parameters:
+    - _data: DataFrame containing Dubai housing data
+    - property_type: Selected property type, or "All"
+    - bedrooms: Selected bedroom option, or "All"
+    - price_range: (min, max) yearly rent in AED, inclusive
+    """
+    filtered_data = _filter_listings(_data, property_type, bedrooms, price_range)
+    neighborhood_data = filtered_data.groupby("neighborhood", observed=True, sort=False).agg({
+        "price_yearly_aed": ["mean", "count"],
+        "lat": "mean",
+        "lng": "mean"
+    })
+    
+    neighborhood_data.columns = ["avg_price", "property_count", "lat", "lng"]
+    return neighborhood_data.reset_index()
+
+@st.cache_data(ttl=3600)
+def _map_html(_data, property_type, bedrooms, price_range):
+    """
+    Build the folium map with one circle per neighborhood and render it to HTML
+    
+    Only the rendered HTML string is cached, so no folium objects are shared
+    between reruns or sessions. Like _neighborhood_summary, it is keyed on
+    the selections only.
+    
+    Parameters:
+    - _data: DataFrame containing Dubai housing data
+    - property_type: Selected property type, or "All"
+    - bedrooms: Selected bedroom option, or "All"
+    - price_range: (min, max) yearly rent in AED, inclusive
+    """
+    neighborhood_data = _neighborhood_summary(_data, property_type, bedrooms, price_range)
+    
+    # Create a map centered on Dubai
+    dubai_map = folium.Map(
+        location=DUBAI_COORDINATES["center"],
+        zoom_start=11,
+        tiles="OpenStreetMap"
+    )
+    
+    # Precompute marker sizes and colors for all neighborhoods at once
+    # Circle size scales with the number of properties
+    radii = np.minimum(10 + neighborhood_data["property_count"].values * 0.5, 30)
+    
+    # Color based on price (darker = more expensive)
+    price_ratios = neighborhood_data["avg_price"].values / neighborhood_data["avg_price"].max()
+    red_channel = (255 * (1 - price_ratios)).astype(np.uint8)
+    green_channel = (180 * (1 - price_ratios)).astype(np.uint8)
+    colors = np.char.add(np.char.add("#", _HEX_BYTES[red_channel]), np.char.add(_HEX_BYTES[green_channel], "00"))
+    
+    # Collect one GeoJSON point per neighborhood so all circles are added
+    # to the map as a single layer
+    features = []
+    for neighborhood, avg_price, property_count, lat, lng, radius, color in zip(
+        neighborhood_data["neighborhood"].values,
+        neighborhood_data["avg_price"].values,
+        neighborhood_data["property_count"].values,
+        neighborhood_data["lat"].values,
+        neighborhood_data["lng"].values,
+        radii,
+        colors
+    ):
+        if pd.notna(lat) and pd.notna(lng):
+            # Create popup with neighborhood info
+            popup_text = f"""
+            <b>{neighborhood}</b><br>
+            Average Price: AED {int(avg_price):,} / year<br>
+            Available Properties: {property_count}<br>
+            """
+            
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [float(lng), float(lat)]},
+                "properties": {
+                    "radius": float(radius),
+                    "color": str(color),
+                    "popup": popup_text
+                }
+            })
+    
+    if features:
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": features},
+            marker=folium.CircleMarker(fill=True, fill_opacity=0.7),
+            style_function=lambda feature: {
+                "color": feature["properties"]["color"],
+                "fillColor": feature["properties"]["color"],
+                "radius": feature["properties"]["radius"]
+            },
+            popup=folium.GeoJsonPopup(fields=["popup"], labels=False, max_width=300)
+        ).add_to(dubai_map)
+    
+    return folium.Figure().add_child(dubai_map).render()
+
+def _property_card_html(property_row):
+    """
+    Build the HTML card for a featured property
+    
+    The markup is kept unindented so several cards can be joined into a
+    single markdown block without being read as a code block.
+    
+    Parameters:
+    - property_row: Listing row from DataFrame.itertuples
+    """
+    bedrooms = "Studio" if property_row.bedrooms == 0 else f"{int(property_row.bedrooms)} BR"
+    
+    return (
+        '<div style="border: 1px solid #ddd; padding: 10px; border-radius: 5px; margin-bottom: 10px;">'
+        f"<h4>{property_row.property_type} in {property_row.neighborhood}</h4>"
+        f"<p>{bedrooms} | {int(property_row.size_sqft)} sqft</p>"
+        f'<p style="font-weight: bold; color: #E6B800;">AED {int(property_row.price_yearly_aed):,}/year</p>'
+        f"<p>AED {int(property_row.price_monthly_aed):,}/month</p>"
+        "</div>"
+    )
 
 def show_map_visualization(data):
     """
@@ -12,22 +161,33 @@ def show_map_visualization(data):
     Parameters:
     - data: DataFrame containing Dubai housing data
     """
+    # Keep only the columns this page uses, so filtering copies less data
+    data = data[[col for col in _USED_COLUMNS if col in data.columns]]
+    
+    # The loader stores these columns as categoricals; convert here only if a
+    # caller passes plain string columns, since the helpers below read .cat
+    if not isinstance(data["neighborhood"].dtype, pd.CategoricalDtype):
+        data = data.assign(
+            neighborhood=data["neighborhood"].astype("category"),
+            property_type=data["property_type"].astype("category")
+        )
+    
     st.header("Dubai Housing Price Map")
     st.write("Explore rental prices across different neighborhoods in Dubai. Use the filters to customize your search.")
     
     # Filters in the sidebar
     st.sidebar.subheader("Map Filters")
+    filter_options = get_filter_options(data)
     
     # Property type filter
-    property_types = ["All"] + sorted(data["property_type"].unique().tolist())
-    selected_property_type = st.sidebar.selectbox("Property Type", property_types)
+    selected_property_type = st.sidebar.selectbox("Property Type", filter_options["property_types"])
     
     # Number of bedrooms filter
     bedroom_options = ["All", "Studio", "1", "2", "3", "4+"]
     selected_bedrooms = st.sidebar.selectbox("Bedrooms", bedroom_options)
     
     # Price range filter
-    max_price = int(data["price_yearly_aed"].max())
+    max_price = filter_options["max_price"]
     price_range = st.sidebar.slider(
         "Yearly Rent Range (AED)",
         min_value=0,
@@ -37,74 +197,17 @@ def show_map_visualization(data):
     )
     
     # Filter data based on selections
-    filtered_data = data.copy()
-    
-    if selected_property_type != "All":
-        filtered_data = filtered_data[filtered_data["property_type"] == selected_property_type]
-    
-    if selected_bedrooms != "All":
-        if selected_bedrooms == "Studio":
-            filtered_data = filtered_data[filtered_data["bedrooms"] == 0]
-        elif selected_bedrooms == "4+":
-            filtered_data = filtered_data[filtered_data["bedrooms"] >= 4]
-        else:
-            filtered_data = filtered_data[filtered_data["bedrooms"] == int(selected_bedrooms)]
-    
-    filtered_data = filtered_data[
-        (filtered_data["price_yearly_aed"] >= price_range[0]) &
-        (filtered_data["price_yearly_aed"] <= price_range[1])
-    ]
+    filtered_data = _filter_listings(data, selected_property_type, selected_bedrooms, price_range)
     
     # Create two columns for the map and stats
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        # Create a map centered on Dubai
-        dubai_map = folium.Map(
-            location=DUBAI_COORDINATES["center"],
-            zoom_start=11,
-            tiles="OpenStreetMap"
-        )
-        
         # Group data by neighborhood for circle markers
-        neighborhood_data = filtered_data.groupby("neighborhood").agg({
-            "price_yearly_aed": ["mean", "count"],
-            "lat": "mean",
-            "lng": "mean"
-        })
-        
-        neighborhood_data.columns = ["avg_price", "property_count", "lat", "lng"]
-        neighborhood_data = neighborhood_data.reset_index()
-        
-        # Add circle markers for each neighborhood
-        for _, row in neighborhood_data.iterrows():
-            if pd.notna(row["lat"]) and pd.notna(row["lng"]):
-                # Scale circle size by number of properties
-                radius = min(10 + (row["property_count"] * 0.5), 30)
-                
-                # Color based on price (darker = more expensive)
-                max_avg_price = neighborhood_data["avg_price"].max()
-                price_ratio = row["avg_price"] / max_avg_price
-                color = f"#{int(255 * (1 - price_ratio)):02x}{int(180 * (1 - price_ratio)):02x}00"
-                
-                # Create popup with neighborhood info
-                popup_text = f"""
-                <b>{row['neighborhood']}</b><br>
-                Average Price: AED {int(row['avg_price']):,} / year<br>
-                Available Properties: {row['property_count']}<br>
-                """
-                
-                folium.CircleMarker(
-                    location=[row["lat"], row["lng"]],
-                    radius=radius,
-                    color=color,
-                    fill=True,
-                    fill_opacity=0.7,
-                    popup=folium.Popup(popup_text, max_width=300)
-                ).add_to(dubai_map)
+        neighborhood_data = _neighborhood_summary(data, selected_property_type, selected_bedrooms, price_range)
         
-        # Display the map
-        folium_static(dubai_map)
+        # Display the map, rendered (or reused) for this set of filters
+        st.iframe(_map_html(data, selected_property_type, selected_bedrooms, price_range), width=700, height=510)
         
         # Additional info about the map
         st.info("Click on any circle to see detailed information about that neighborhood. Larger circles indicate more available properties. Darker colors indicate higher prices.")
@@ -122,10 +225,19 @@ def show_map_visualization(data):
             st.metric("Average Yearly Rent", f"AED {avg_price:,}")
             st.metric("Median Yearly Rent", f"AED {median_price:,}")
             
-            # Create a chart showing price distribution
-            price_chart = alt.Chart(filtered_data).mark_bar().encode(
-                x=alt.X('price_yearly_aed:Q', bin=True, title='Yearly Rent (AED)'),
-                y=alt.Y('count()', title='Number of Properties')
+            # Create a chart showing price distribution, binned here so only the
+            # bar heights are sent to the browser instead of every listing
+            counts, edges = np.histogram(filtered_data["price_yearly_aed"].values, bins=30)
+            histogram_data = pd.DataFrame({
+                "bin_start": edges[:-1],
+                "bin_end": edges[1:],
+                "count": counts
+            })
+            
+            price_chart = alt.Chart(histogram_data).mark_bar().encode(
+                x=alt.X('bin_start:Q', title='Yearly Rent (AED)'),
+                x2='bin_end:Q',
+                y=alt.Y('count:Q', title='Number of Properties')
             ).properties(
                 title='Price Distribution',
                 height=200
@@ -136,18 +248,12 @@ def show_map_visualization(data):
             # Show top 5 most affordable neighborhoods
             st.subheader("Most Affordable Neighborhoods")
             
-            if "neighborhood" in filtered_data.columns:
-                affordable_neighborhoods = (
-                    filtered_data.groupby("neighborhood")
-                    .agg({"price_yearly_aed": "mean", "property_type": "count"})
-                    .rename(columns={"property_type": "count"})
-                    .sort_values("price_yearly_aed")
-                    .reset_index()
-                    .head(5)
-                )
-                
-                for i, row in affordable_neighborhoods.iterrows():
-                    st.write(f"{i+1}. **{row['neighborhood']}** - AED {int(row['price_yearly_aed']):,}/year")
+            # Reuse the per-neighborhood averages computed for the map markers and
+            # select the five cheapest with a partial sort
+            affordable_neighborhoods = neighborhood_data.nsmallest(5, "avg_price")
+            
+            for i, row in enumerate(affordable_neighborhoods.itertuples(index=False), start=1):
+                st.write(f"{i}. **{row.neighborhood}** - AED {int(row.avg_price):,}/year")
         else:
             st.warning("No properties match your selected filters. Please adjust your criteria.")
     
@@ -158,19 +264,13 @@ def show_map_visualization(data):
         # Sort by price and get the most affordable options
         affordable_properties = filtered_data.sort_values("price_yearly_aed").head(6)
         
-        # Create a 3x2 grid for property cards
+        # Create a 3x2 grid for property cards, rendering each column's cards
+        # with a single markdown call
         cols = st.columns(3)
+        property_rows = list(affordable_properties.itertuples(index=False))
         
-        for i, (_, property_row) in enumerate(affordable_properties.iterrows()):
-            with cols[i % 3]:
-                st.markdown(f"""
-                    <div style="border: 1px solid #ddd; padding: 10px; border-radius: 5px; margin-bottom: 10px;">
-                        <h4>{property_row['property_type']} in {property_row['neighborhood']}</h4>
-                        <p>
-                            {'Studio' if property_row['bedrooms'] == 0 else f"{int(property_row['bedrooms'])} BR"} 
-                            | {int(property_row['size_sqft'])} sqft
-                        </p>
-                        <p style="font-weight: bold; color: #E6B800;">AED {int(property_row['price_yearly_aed']):,}/year</p>
-                        <p>AED {int(property_row['price_monthly_aed']):,}/month</p>
-                    </div>
-                """, unsafe_allow_html=True)
+        for col_index, col in enumerate(cols):
+            col.markdown(
+                "".join(_property_card_html(property_row) for property_row in property_rows[col_index::3]),
+                unsafe_allow_html=True
+            )
@@ -2,12 +2,136 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 import os
-from datetime import datetime, timedelta
-import time
-import random
+import tempfile
+from datetime import datetime
 from utils.constants import DUBAI_COORDINATES, NEIGHBORHOOD_INFO
 
-@st.cache_data(ttl=3600)
+# On-disk copy of the generated dataset, shared by every app process. Bump the
+# version in the file name whenever the columns or dtypes below change
+_DATA_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "dubai_housing_v2.parquet")
+
+# Columns and dtypes the pages rely on; a persisted file that doesn't match
+# exactly is regenerated instead of used
+_DATASET_DTYPES = {
+    "id": "int32",
+    "neighborhood": "category",
+    "area": "category",
+    "property_type": "category",
+    "bedrooms": "int8",
+    "bathrooms": "int8",
+    "size_sqft": "int32",
+    "price_yearly_aed": "int32",
+    "price_monthly_aed": "int32",
+    "date_posted": "datetime64[ns]",
+    "lat": "float32",
+    "lng": "float32",
+    "price_per_sqft": "float32",
+    "year": "int16",
+    "year_month": "category",
+    "year_quarter": "category"
+}
+
+# Areas of Dubai and the neighborhoods each contains
+_AREAS = {
+    "Downtown": ["Downtown Dubai", "Business Bay", "DIFC"],
+    "Marina Area": ["Dubai Marina", "JBR", "JLT"],
+    "Palm Jumeirah": ["Palm Jumeirah"],
+    "New Dubai": ["Dubai Hills Estate", "Arabian Ranches", "Emirates Hills"],
+    "Academic City": ["Dubai Silicon Oasis", "Academic City", "International City"],
+    "Sports City": ["Sports City", "Motor City", "JVC"],
+    "Old Dubai": ["Deira", "Bur Dubai", "Al Karama"]
+}
+
+# Reverse map from neighborhood to area
+_NEIGHBORHOOD_TO_AREA = {nb: area for area, nbs in _AREAS.items() for nb in nbs}
+
+# Property types and how often each is listed (apartments are more common)
+_PROPERTY_TYPES = ["Apartment", "Villa", "Townhouse", "Penthouse", "Studio"]
+_PROPERTY_TYPE_WEIGHTS = [0.7, 0.1, 0.1, 0.05, 0.05]
+
+# Yearly price per sqft multipliers by area and by property type
+_AREA_PRICE_FACTORS = {
+    "Downtown": 1.5,
+    "Marina Area": 1.3,
+    "Palm Jumeirah": 1.8,
+    "New Dubai": 1.1,
+    "Academic City": 0.7,
+    "Sports City": 0.8,
+    "Old Dubai": 0.9
+}
+
+_PROPERTY_TYPE_FACTORS = {
+    "Apartment": 1.0,
+    "Villa": 1.3,
+    "Townhouse": 1.2,
+    "Penthouse": 1.5,
+    "Studio": 0.9
+}
+
+# Base price per sqft in AED (yearly)
+_BASE_PRICE_PER_SQFT = 90
+
+def _period_categorical(keys, label):
+    """
+    Build a categorical of period labels from integer period keys
+    
+    Each distinct key is formatted once, and the categories come out in
+    chronological order.
+    
+    Parameters:
+    - keys: Integer period key for each row (e.g. year * 10 + quarter)
+    - label: Function turning one key into its display label
+    """
+    unique_keys, codes = np.unique(keys, return_inverse=True)
+    return pd.Categorical.from_codes(codes, [label(key) for key in unique_keys])
+
+def _read_persisted_dataset():
+    """
+    Read the dataset persisted earlier today, if there is a usable one.
+    
+    Listing dates are relative to the generation day, so older copies are
+    ignored. A file that can't be read or whose columns and dtypes don't
+    match _DATASET_DTYPES is treated as missing.
+    
+    Returns:
+        DataFrame or None: The persisted dataset, or None if it must be regenerated
+    """
+    try:
+        cached_on = datetime.fromtimestamp(os.path.getmtime(_DATA_CACHE_PATH)).date()
+        if cached_on != datetime.now().date():
+            return None
+        
+        df = pd.read_parquet(_DATA_CACHE_PATH)
+    except Exception:
+        return None
+    
+    dtypes = {column: str(dtype) for column, dtype in df.dtypes.items()}
+    return df if dtypes == _DATASET_DTYPES else None
+
+def _persist_dataset(df):
+    """
+    Write the dataset to _DATA_CACHE_PATH for later cache misses and other processes.
+    
+    The file is written under a temporary name and moved into place, so
+    readers never see a partial file. Failures are ignored; the app still
+    works from memory.
+    
+    Parameters:
+    - df: Generated housing DataFrame
+    """
+    cache_dir = os.path.dirname(_DATA_CACHE_PATH)
+    temp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".parquet.tmp")
+        os.close(fd)
+        df.to_parquet(temp_path, compression="zstd")
+        os.replace(temp_path, _DATA_CACHE_PATH)
+    except Exception:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+@st.cache_resource(ttl=3600, show_spinner="Loading Dubai housing data...")
 def load_dubai_housing_data():
     """
     Load Dubai housing data from a data source.
@@ -16,12 +140,18 @@ def load_dubai_housing_data():
     Since we don't have access to real data in this example, this function creates 
     synthetic data based on typical Dubai rental patterns.
     
+    The returned DataFrame is shared by every rerun and session without being
+    copied, so callers must treat it as read-only and derive new frames
+    (column selection, masks, assign) instead of modifying it in place.
+    
     Returns:
         DataFrame: A pandas DataFrame containing housing data
     """
     try:
-        # Simulate a small delay to mimic data loading
-        time.sleep(1)
+        # Reuse the dataset persisted earlier today, if there is a valid one
+        persisted = _read_persisted_dataset()
+        if persisted is not None:
+            return persisted
         
         # In a real application, you would load data from a real source:
         # Example:
@@ -35,164 +165,223 @@ def load_dubai_housing_data():
         # This is a list of representative Dubai neighborhoods
         neighborhoods = list(NEIGHBORHOOD_INFO.keys())
         
-        # Create areas based on neighborhoods (each area contains multiple neighborhoods)
-        areas = {
-            "Downtown": ["Downtown Dubai", "Business Bay", "DIFC"],
-            "Marina Area": ["Dubai Marina", "JBR", "JLT"],
-            "Palm Jumeirah": ["Palm Jumeirah"],
-            "New Dubai": ["Dubai Hills Estate", "Arabian Ranches", "Emirates Hills"],
-            "Academic City": ["Dubai Silicon Oasis", "Academic City", "International City"],
-            "Sports City": ["Sports City", "Motor City", "JVC"],
-            "Old Dubai": ["Deira", "Bur Dubai", "Al Karama"]
-        }
-        
-        # Reverse map from neighborhood to area
-        neighborhood_to_area = {}
-        for area, nbs in areas.items():
-            for nb in nbs:
-                neighborhood_to_area[nb] = area
-        
-        # Property types
-        property_types = ["Apartment", "Villa", "Townhouse", "Penthouse", "Studio"]
-        
         # Number of records to generate
         num_records = 1000
         
         # Current date
         today = datetime.now()
         
-        # Create lists for each column
-        data_dict = {
-            "id": list(range(1, num_records + 1)),
-            "neighborhood": [],
-            "area": [],
-            "property_type": [],
-            "bedrooms": [],
-            "bathrooms": [],
-            "size_sqft": [],
-            "price_yearly_aed": [],
-            "price_monthly_aed": [],
-            "date_posted": [],
-            "lat": [],
-            "lng": []
-        }
-        
-        for _ in range(num_records):
-            # Select a random neighborhood
-            neighborhood = random.choice(neighborhoods)
-            
-            # Get the area for the neighborhood
-            area = neighborhood_to_area.get(neighborhood, "Other")
-            
-            # Select a property type with weighted probability
-            # Apartments are more common
-            prop_type_weights = [0.7, 0.1, 0.1, 0.05, 0.05]
-            property_type = random.choices(property_types, weights=prop_type_weights)[0]
-            
-            # Assign bedrooms based on property type
-            if property_type == "Studio":
-                bedrooms = 0
-            elif property_type == "Apartment":
-                bedrooms = random.choices([1, 2, 3, 4], weights=[0.4, 0.4, 0.15, 0.05])[0]
-            elif property_type == "Penthouse":
-                bedrooms = random.choices([2, 3, 4, 5], weights=[0.1, 0.3, 0.4, 0.2])[0]
-            else:  # Villa or Townhouse
-                bedrooms = random.choices([2, 3, 4, 5, 6], weights=[0.05, 0.3, 0.4, 0.2, 0.05])[0]
-            
-            # Bathrooms are generally related to bedrooms
-            bathrooms = max(1, min(bedrooms, random.choices(
-                [bedrooms - 1, bedrooms, bedrooms + 1], 
-                weights=[0.3, 0.6, 0.1]
-            )[0]))
-            
-            # Size depends on property type and bedrooms
-            if property_type == "Studio":
-                size_sqft = random.randint(300, 600)
-            elif property_type == "Apartment":
-                base_size = 600
-                size_sqft = base_size + (bedrooms * random.randint(200, 400))
-            elif property_type == "Penthouse":
-                base_size = 1500
-                size_sqft = base_size + (bedrooms * random.randint(400, 700))
-            else:  # Villa or Townhouse
-                base_size = 1200
-                size_sqft = base_size + (bedrooms * random.randint(500, 800))
-            
-            # Price depends on area, property type, size, and bedrooms
-            # Base price per sqft varies by area
-            area_price_factors = {
-                "Downtown": 1.5,
-                "Marina Area": 1.3,
-                "Palm Jumeirah": 1.8,
-                "New Dubai": 1.1,
-                "Academic City": 0.7,
-                "Sports City": 0.8,
-                "Old Dubai": 0.9
-            }
-            
-            # Property type price factors
-            property_type_factors = {
-                "Apartment": 1.0,
-                "Villa": 1.3,
-                "Townhouse": 1.2,
-                "Penthouse": 1.5,
-                "Studio": 0.9
-            }
-            
-            # Base price per sqft in AED (yearly)
-            base_price_per_sqft = 90  # AED per sqft per year
-            
-            # Calculate yearly price
-            price_factor = area_price_factors.get(area, 1.0) * property_type_factors.get(property_type, 1.0)
-            price_per_sqft = base_price_per_sqft * price_factor
-            
-            # Add some randomness
-            price_per_sqft = price_per_sqft * random.uniform(0.9, 1.1)
-            
-            # Calculate yearly price
-            price_yearly_aed = int(size_sqft * price_per_sqft)
-            
-            # Monthly price is yearly / 12 (rounded to nearest 100)
-            price_monthly_aed = int(round(price_yearly_aed / 12, -2))
-            
-            # Random date posted within the last 180 days
-            date_posted = today - timedelta(days=random.randint(1, 180))
-            
-            # Get coordinates for the neighborhood with some randomness
-            if neighborhood in NEIGHBORHOOD_INFO and "coordinates" in NEIGHBORHOOD_INFO[neighborhood]:
-                base_lat = NEIGHBORHOOD_INFO[neighborhood]["coordinates"][0]
-                base_lng = NEIGHBORHOOD_INFO[neighborhood]["coordinates"][1]
-            else:
-                # Use Dubai center coordinates as fallback
-                base_lat = DUBAI_COORDINATES["center"][0]
-                base_lng = DUBAI_COORDINATES["center"][1]
-            
-            # Add small random variations to coordinates
-            lat = base_lat + random.uniform(-0.01, 0.01)
-            lng = base_lng + random.uniform(-0.01, 0.01)
-            
-            # Append to the data dictionary
-            data_dict["neighborhood"].append(neighborhood)
-            data_dict["area"].append(area)
-            data_dict["property_type"].append(property_type)
-            data_dict["bedrooms"].append(bedrooms)
-            data_dict["bathrooms"].append(bathrooms)
-            data_dict["size_sqft"].append(size_sqft)
-            data_dict["price_yearly_aed"].append(price_yearly_aed)
-            data_dict["price_monthly_aed"].append(price_monthly_aed)
-            data_dict["date_posted"].append(date_posted)
-            data_dict["lat"].append(lat)
-            data_dict["lng"].append(lng)
+        # Draw every column for all records at once instead of row by row
+        rng = np.random.default_rng(42)
+        
+        # Select a random neighborhood for each record
+        neighborhood_idx = rng.integers(0, len(neighborhoods), size=num_records)
+        neighborhood_names = np.array(neighborhoods)
+        
+        # Get the area for each neighborhood
+        neighborhood_areas = pd.Series(neighborhoods).map(_NEIGHBORHOOD_TO_AREA).fillna("Other").to_numpy()
+        
+        # Select a property type with weighted probability
+        property_type_idx = rng.choice(len(_PROPERTY_TYPES), size=num_records, p=_PROPERTY_TYPE_WEIGHTS)
+        property_type_names = np.array(_PROPERTY_TYPES)[property_type_idx]
+        
+        is_studio = property_type_names == "Studio"
+        is_apartment = property_type_names == "Apartment"
+        is_penthouse = property_type_names == "Penthouse"
+        
+        # Assign bedrooms based on property type (Villa or Townhouse is the default)
+        bedrooms = np.select(
+            [is_studio, is_apartment, is_penthouse],
+            [
+                0,
+                rng.choice([1, 2, 3, 4], size=num_records, p=[0.4, 0.4, 0.15, 0.05]),
+                rng.choice([2, 3, 4, 5], size=num_records, p=[0.1, 0.3, 0.4, 0.2])
+            ],
+            default=rng.choice([2, 3, 4, 5, 6], size=num_records, p=[0.05, 0.3, 0.4, 0.2, 0.05])
+        )
+        
+        # Bathrooms are generally related to bedrooms
+        bathroom_offsets = rng.choice([-1, 0, 1], size=num_records, p=[0.3, 0.6, 0.1])
+        bathrooms = np.maximum(1, np.minimum(bedrooms, bedrooms + bathroom_offsets))
+        
+        # Size depends on property type and bedrooms: a base size plus a random
+        # amount per bedroom (studios get a single random size)
+        # Order matches _PROPERTY_TYPES: Apartment, Villa, Townhouse, Penthouse, Studio
+        base_sizes = np.array([600, 1200, 1200, 1500, 0])
+        size_per_bedroom_low = np.array([200, 500, 500, 400, 300])
+        size_per_bedroom_high = np.array([400, 800, 800, 700, 600])
+        size_sqft = base_sizes[property_type_idx] + np.where(is_studio, 1, bedrooms) * rng.integers(
+            size_per_bedroom_low[property_type_idx],
+            size_per_bedroom_high[property_type_idx],
+            endpoint=True
+        )
+        
+        # Price depends on area, property type, size, and bedrooms
+        # Calculate yearly price, using per-neighborhood and per-type factor
+        # arrays in place of dict lookups; the property type set is closed,
+        # so only unknown areas need a default factor
+        neighborhood_area_factors = pd.Series(neighborhood_areas).map(_AREA_PRICE_FACTORS).fillna(1.0).to_numpy()
+        type_factors = pd.Series(_PROPERTY_TYPES).map(_PROPERTY_TYPE_FACTORS).to_numpy()
+        price_per_sqft = _BASE_PRICE_PER_SQFT * neighborhood_area_factors[neighborhood_idx] * type_factors[property_type_idx]
+        
+        # Add some randomness
+        price_per_sqft = price_per_sqft * rng.uniform(0.9, 1.1, size=num_records)
+        
+        # Calculate yearly price
+        price_yearly_aed = (size_sqft * price_per_sqft).astype(np.int64)
+        
+        # Monthly price is yearly / 12 (rounded to nearest 100)
+        price_monthly_aed = np.round(price_yearly_aed / 12, -2).astype(np.int64)
+        
+        # Random date posted within the last 180 days
+        date_posted = pd.Timestamp(today) - pd.to_timedelta(rng.integers(1, 180, size=num_records, endpoint=True), unit="D")
+        
+        # Get coordinates for each neighborhood, using Dubai center coordinates
+        # as fallback
+        base_coordinates = np.array([
+            NEIGHBORHOOD_INFO.get(nb, {}).get("coordinates", DUBAI_COORDINATES["center"])
+            for nb in neighborhoods
+        ])
+        
+        # Add small random variations to coordinates
+        lat = base_coordinates[neighborhood_idx, 0] + rng.uniform(-0.01, 0.01, size=num_records)
+        lng = base_coordinates[neighborhood_idx, 1] + rng.uniform(-0.01, 0.01, size=num_records)
         
         # Create the DataFrame
-        df = pd.DataFrame(data_dict)
+        df = pd.DataFrame({
+            "id": np.arange(1, num_records + 1),
+            "neighborhood": neighborhood_names[neighborhood_idx],
+            "area": neighborhood_areas[neighborhood_idx],
+            "property_type": property_type_names,
+            "bedrooms": bedrooms,
+            "bathrooms": bathrooms,
+            "size_sqft": size_sqft,
+            "price_yearly_aed": price_yearly_aed,
+            "price_monthly_aed": price_monthly_aed,
+            "date_posted": date_posted,
+            "lat": lat,
+            "lng": lng
+        })
+        
+        # Low-cardinality string columns are stored as categoricals, so
+        # filters and groupbys work on integer codes
+        for column in ("neighborhood", "area", "property_type"):
+            df[column] = df[column].astype("category")
         
         # Add derived columns
         df["price_per_sqft"] = df["price_yearly_aed"] / df["size_sqft"]
         
+        # Downcast numeric columns to the narrowest types that hold their
+        # values, which roughly halves the frame's memory footprint
+        df = df.astype({
+            "id": "int32",
+            "bedrooms": "int8",
+            "bathrooms": "int8",
+            "size_sqft": "int32",
+            "price_yearly_aed": "int32",
+            "price_monthly_aed": "int32",
+            "lat": "float32",
+            "lng": "float32",
+            "price_per_sqft": "float32"
+        })
+        
+        # Posting period keys used by the trend page, computed once here
+        # instead of re-deriving them from date_posted on every rerun. Month
+        # and quarter labels are built from integer year/month arithmetic,
+        # so only the distinct periods are formatted as strings
+        years = df["date_posted"].dt.year.to_numpy()
+        months = df["date_posted"].dt.month.to_numpy()
+        df["year"] = years.astype("int16")
+        df["year_month"] = _period_categorical(years * 100 + months, lambda key: f"{key // 100}-{key % 100:02d}")
+        df["year_quarter"] = _period_categorical(years * 10 + (months - 1) // 3 + 1, lambda key: f"{key // 10}Q{key % 10}")
+        
+        # Keep rows blocked by neighborhood so per-neighborhood groupbys can
+        # skip re-sorting their keys (sort=False keeps this order)
+        df = df.sort_values("neighborhood", kind="stable").reset_index(drop=True)
+        
+        # Persist the dataset for later cache misses and other processes
+        _persist_dataset(df)
+        
         # Return the DataFrame
         return df
         
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
         return None
+
+def listing_mask(data, property_type="All", bedrooms="All", area="All"):
+    """
+    Boolean mask of the listings matching the page filter selections.
+    
+    All predicates are ANDed into one NumPy mask, so callers index the frame
+    only once.
+    
+    Parameters:
+    - data: DataFrame containing Dubai housing data
+    - property_type: Selected property type, or "All"
+    - bedrooms: Selected bedroom option, or "All". "Studio" means no
+      bedrooms, a trailing "+" means at least that many (e.g. "3+ BR",
+      "4+"), otherwise exactly that many (e.g. "2 BR", "2")
+    - area: Selected area, or "All"
+    
+    Returns:
+        ndarray: Boolean mask aligned with the rows of data
+    """
+    mask = np.ones(len(data), dtype=bool)
+    
+    if property_type != "All":
+        mask &= data["property_type"].values == property_type
+    
+    if bedrooms != "All":
+        bedroom_counts = data["bedrooms"].values
+        if bedrooms == "Studio":
+            mask &= bedroom_counts == 0
+        else:
+            count = bedrooms.split()[0]
+            if count.endswith("+"):
+                mask &= bedroom_counts >= int(count[:-1])
+            else:
+                mask &= bedroom_counts == int(count)
+    
+    if area != "All":
+        mask &= data["area"].values == area
+    
+    return mask
+
+def _sorted_values(column):
+    """
+    Sorted distinct values of a column, read from the categories when the
+    column is categorical
+    
+    Parameters:
+    - column: Series to collect values from
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return list(column.cat.categories)
+    return sorted(column.unique().tolist())
+
+def get_filter_options(data):
+    """
+    Collect the choices offered by the page filter widgets.
+    
+    Reads the categorical columns' categories plus a single max, which is
+    cheaper than hashing the frame for a cache lookup, so it isn't cached.
+    
+    Parameters:
+    - data: DataFrame containing Dubai housing data
+    
+    Returns:
+        dict: Neighborhood names, property type options (with "All"), area
+        options (with "All", when the data has an area column) and the
+        highest yearly rent
+    """
+    filter_options = {
+        "neighborhoods": _sorted_values(data["neighborhood"]),
+        "property_types": ["All"] + _sorted_values(data["property_type"]),
+        "max_price": int(data["price_yearly_aed"].max())
+    }
+    
+    if "area" in data.columns:
+        filter_options["areas"] = ["All"] + _sorted_values(data["area"])
+    
+    return filter_options